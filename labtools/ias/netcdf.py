@@ -1,8 +1,6 @@
 from typing import Any, Dict, List, Union, Optional
 from pathlib import Path
 
-import netCDF4
-import numpy as np
 import json
 import geojson
 from geojson import Polygon
@@ -13,12 +11,25 @@ from labtools.utils import utc_to_iso
 def get_netcdf_footprint(netcdf_file) -> Optional[Dict[str, Any]]:
     """Returns the GeoJSON Geometry of a OMEGA_C_Channel_Proj NetCDF data product.
     """
+    import netCDF4
+
     try:
         nc_dataset = netCDF4.Dataset(netcdf_file, 'r')
     except Exception as e:
         print(e)
         print(f'Unable to read NetCDF data product: {netcdf_file}')
         return None
+    try:
+        return get_dataset_footprint(nc_dataset)
+    finally:
+        nc_dataset.close()
+
+
+def get_dataset_footprint(nc_dataset) -> Dict[str, Any]:
+    """Returns the GeoJSON Geometry of an open OMEGA_C_Channel_Proj NetCDF dataset.
+    """
+    import numpy as np
+
     alt = nc_dataset.variables['altitude']
     latitudes = nc_dataset.variables['latitude']
     longitudes = nc_dataset.variables['longitude']
@@ -71,66 +82,94 @@ def get_netcdf_footprint(netcdf_file) -> Optional[Dict[str, Any]]:
 
     geometry = json.loads(geojson.dumps(Polygon([poly_geopts])))
 
-    nc_dataset.close()
-
     return geometry
 
 
 def get_netcdf_properties(netcdf_file, schema_name):
     """Returns a selection of metadata derived from a OMEGA_C_Channel_Proj NetCDF data product.
     """
-    if schema_name == 'OMEGA_C_PROJ':
+    import netCDF4
+
+    if schema_name not in ('OMEGA_C_PROJ', 'OMEGA_CUBE'):
+        raise Exception(f'Unknown schema name: {schema_name}')
+    try:
+        nc_dataset = netCDF4.Dataset(netcdf_file, 'r')
         try:
-            nc_dataset = netCDF4.Dataset(netcdf_file, 'r')
-            # derive i,e,phase angles from data product
-            incidence_angle = float(np.mean(nc_dataset['incidence_n']).data)
-            mean_tau = float(np.mean(nc_dataset['tau']).data)
-            mean_tau = mean_tau if not np.isnan(mean_tau) else None
-            mean_watericelin = float(np.mean(nc_dataset['watericelin']).data)
-            mean_watericelin = mean_watericelin if not np.isnan(mean_watericelin) else None
-            mean_icecloudindex = float(np.mean(nc_dataset['icecloudindex']).data)
-            mean_icecloudindex = mean_icecloudindex if not np.isnan(mean_icecloudindex) else None
-            props = {
-                # 'title': nc_dataset.title,
-                # 'created': nc_dataset.history  # TODO: parse 'Created 28/03/18'
-                'mean_tau': mean_tau, # float(np.mean(nc_dataset['tau']).data),
-                'mean_watericelin': mean_watericelin,  # float(np.mean(nc_dataset['watericelin']).data),
-                'mean_icecloudindex': mean_icecloudindex,  # float(np.mean(nc_dataset['icecloudindex']).data),
-                'incidence_angle': incidence_angle
-            }
+            return get_dataset_properties(nc_dataset, schema_name)
+        finally:
             nc_dataset.close()
-            return props
+    except Exception as e:
+        print(e)
+        print(f'Unable to read NetCDF data product: {netcdf_file}')
+        return {}
+
+
+def get_netcdf_footprint_and_properties(netcdf_file, schema_name) -> tuple[Optional[Dict[str, Any]], Dict[str, Any]]:
+    """Returns both the GeoJSON Geometry and a selection of metadata of a NetCDF data product, opening it once.
+    """
+    import netCDF4
+
+    try:
+        nc_dataset = netCDF4.Dataset(netcdf_file, 'r')
+    except Exception as e:
+        print(e)
+        print(f'Unable to read NetCDF data product: {netcdf_file}')
+        return None, {}
+
+    try:
+        geometry = None
+        try:
+            geometry = get_dataset_footprint(nc_dataset)
         except Exception as e:
             print(e)
-            print(f'Unable to read NetCDF data product: {netcdf_file}')
-            return {}
-    elif schema_name == 'OMEGA_CUBE':
-        # ATTENTION: Currently assuming that a OMEGA_C_PROJ NetCDF file is read so as to retrieve start and stop times
-        # mission in OMEGA_CUBE NetCDF files.
+            print(f'Unable to extract footprint geometry from source NetCDF file: {netcdf_file}')
+
+        properties = {}
         try:
-            nc_dataset = netCDF4.Dataset(netcdf_file, 'r')
-            # derive i,e,phase angles from data product
-            incidence_angle = float(np.mean(nc_dataset['incidence_n']).data)
-            mean_tau = float(np.mean(nc_dataset['tau']).data)
-            mean_tau = mean_tau if not np.isnan(mean_tau) else None
-            mean_watericelin = float(np.mean(nc_dataset['watericelin']).data)
-            mean_watericelin = mean_watericelin if not np.isnan(mean_watericelin) else None
-            mean_icecloudindex = float(np.mean(nc_dataset['icecloudindex']).data)
-            mean_icecloudindex = mean_icecloudindex if not np.isnan(mean_icecloudindex) else None
-            props = {
-                'datetime': utc_to_iso(nc_dataset.variables['start_time'].getValue(), timespec='milliseconds'),
-                'start_time': utc_to_iso(nc_dataset.variables['start_time'].getValue(), timespec='milliseconds'),
-                'end_time': utc_to_iso(nc_dataset.variables['stop_time'].getValue(), timespec='milliseconds'),
-                'mean_tau': mean_tau, # float(np.mean(nc_dataset['tau']).data),
-                'mean_watericelin': mean_watericelin,  # float(np.mean(nc_dataset['watericelin']).data),
-                'mean_icecloudindex': mean_icecloudindex,  # float(np.mean(nc_dataset['icecloudindex']).data),
-                'incidence_angle': incidence_angle
-            }
-            nc_dataset.close()
-            return props
+            properties = get_dataset_properties(nc_dataset, schema_name)
         except Exception as e:
             print(e)
-            print(f'Unable to read NetCDF data product: {netcdf_file}')
-            return {}
+            print(f'Unable to extract properties from NetCDF file: {netcdf_file}')
+    finally:
+        nc_dataset.close()
+
+    return geometry, properties
+
+
+def get_dataset_properties(nc_dataset, schema_name):
+    """Returns a selection of metadata derived from an open OMEGA_C_Channel_Proj NetCDF dataset.
+    """
+    import numpy as np
+
+    # derive i,e,phase angles from data product
+    incidence_angle = float(np.mean(nc_dataset['incidence_n']).data)
+    mean_tau = float(np.mean(nc_dataset['tau']).data)
+    mean_tau = mean_tau if not np.isnan(mean_tau) else None
+    mean_watericelin = float(np.mean(nc_dataset['watericelin']).data)
+    mean_watericelin = mean_watericelin if not np.isnan(mean_watericelin) else None
+    mean_icecloudindex = float(np.mean(nc_dataset['icecloudindex']).data)
+    mean_icecloudindex = mean_icecloudindex if not np.isnan(mean_icecloudindex) else None
+    if schema_name == 'OMEGA_C_PROJ':
+        props = {
+            # 'title': nc_dataset.title,
+            # 'created': nc_dataset.history  # TODO: parse 'Created 28/03/18'
+            'mean_tau': mean_tau, # float(np.mean(nc_dataset['tau']).data),
+            'mean_watericelin': mean_watericelin,  # float(np.mean(nc_dataset['watericelin']).data),
+            'mean_icecloudindex': mean_icecloudindex,  # float(np.mean(nc_dataset['icecloudindex']).data),
+            'incidence_angle': incidence_angle
+        }
+    elif schema_name == 'OMEGA_CUBE':
+        # ATTENTION: Currently assuming that a OMEGA_C_PROJ NetCDF file is read so as to retrieve start and stop times
+        # mission in OMEGA_CUBE NetCDF files.
+        props = {
+            'datetime': utc_to_iso(nc_dataset.variables['start_time'].getValue(), timespec='milliseconds'),
+            'start_time': utc_to_iso(nc_dataset.variables['start_time'].getValue(), timespec='milliseconds'),
+            'end_time': utc_to_iso(nc_dataset.variables['stop_time'].getValue(), timespec='milliseconds'),
+            'mean_tau': mean_tau, # float(np.mean(nc_dataset['tau']).data),
+            'mean_watericelin': mean_watericelin,  # float(np.mean(nc_dataset['watericelin']).data),
+            'mean_icecloudindex': mean_icecloudindex,  # float(np.mean(nc_dataset['icecloudindex']).data),
+            'incidence_angle': incidence_angle
+        }
     else:
-        raise Exception(f'Unknown schema name: {schema_name}')
\ No newline at end of file
+        raise Exception(f'Unknown schema name: {schema_name}')
+    return props
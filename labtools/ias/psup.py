@@ -1,21 +1,78 @@
 import os
-from contextlib import closing
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, as_completed
 # from urllib.request import urlretrieve
 import requests
+from requests.adapters import HTTPAdapter
 from pathlib import Path
 import json
-from pydantic import BaseModel
+import hashlib
+import pickle
+import tempfile
+from pydantic import BaseModel, parse_obj_as
 import shutil
 
-import netCDF4
+import ijson
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 from labtools.schemas import factory
 
+MAX_DOWNLOAD_WORKERS = 8
+
+# shared HTTP session, so that PSUP requests and data files downloads re-use pooled connections
+session = requests.Session()
+session.mount('http://', HTTPAdapter(pool_connections=16, pool_maxsize=16))
+session.mount('https://', HTTPAdapter(pool_connections=16, pool_maxsize=16))
+
+def _json_dumps(obj):
+    """Serializes an object to JSON bytes, using orjson if available."""
+    if orjson:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode()
+
+def _json_loads(data):
+    """Deserializes JSON bytes, using orjson if available."""
+    if orjson:
+        return orjson.loads(data)
+    return json.loads(data)
+
 class PSUP_Collection(BaseModel):
     id: str
     schema_name: str
     n_products: int
 
+def _download_psup_response(psup_url, limit, response_file):
+    """Streams a PSUP response body to a file, and returns the total number of available products."""
+    response_file.seek(0)
+    response_file.truncate()
+    with session.get(psup_url, params=dict(limit=limit), stream=True) as r:
+        if r.ok:
+            r.raw.decode_content = True
+            shutil.copyfileobj(r.raw, response_file)
+        else:
+            raise Exception(f'Invalid PSUP response.')
+
+    # look for both "total" and "data" keys in a single pass, stopping as soon as both are found
+    response_file.seek(0)
+    n_products = None
+    has_data = False
+    for prefix, event, value in ijson.parse(response_file):
+        if prefix == 'total' and event == 'number':
+            n_products = value
+        elif prefix == 'data' and event == 'start_array':
+            has_data = True
+        if n_products is not None and has_data:
+            break
+    if n_products is None:
+        raise Exception('Invalid PSUP response: no "total" key found.')
+    if not has_data:
+        raise Exception('Invalid PSUP response: no "data" key found.')
+    response_file.seek(0)
+    return n_products
+
 def download_collection(collection_id, psup_url, metadata_schema, output_dir='source', overwrite=False):
 
     # set output source collection file name
@@ -28,54 +85,48 @@ def download_collection(collection_id, psup_url, metadata_schema, output_dir='so
         print()
         return source_collection_file
 
-    # check connection and get the total number of products
-    with closing(requests.get(psup_url, params=dict(limit=0))) as r:
-        if r.ok:
-            response = r.json()
-            if 'total' in response.keys():
-                n_products = response['total']
-                max_n_products = 13000
-                if n_products > max_n_products:
-                    print(f'WARNING: Number of products higher than {max_n_products}: {n_products}')
-            else:
-                Exception('Invalid PSUP response: no "total" key found.')
-        else:
-            raise Exception(f'Invalid PSUP response.')
-
-    with closing(requests.get(psup_url, params=dict(limit=n_products))) as r:
-        if r.ok:
-            response = r.json()
-            if 'data' in response.keys():
-                records = response['data']
-            else:
-                Exception('Invalid PSUP response: no "data" key found.')
-        else:
-            raise Exception(f'Invalid PSUP response.')
-
     # create output directory if does not exist
     Path.mkdir(output_dir, parents=True, exist_ok=True)
 
-    # write source collection file, holding both collection and products metadata
-    products_dict = {
-        'collection': {
+    # stream PSUP response body to an intermediate file, so that the response is never held in memory
+    with tempfile.TemporaryFile(dir=output_dir) as response_file:
+        # request all products at once, only requesting again if more products than expected are available
+        max_n_products = 13000
+        n_products = _download_psup_response(psup_url, max_n_products, response_file)
+        if n_products > max_n_products:
+            print(f'WARNING: Number of products higher than {max_n_products}: {n_products}')
+            n_products = _download_psup_response(psup_url, n_products, response_file)
+
+        # write source collection file, holding both collection and products metadata, one record at a time
+        collection_dict = {
             'id': collection_id,
             'schema_name': metadata_schema,
             'n_products': n_products
-        },
-        'products': records
-    }
-    with open(source_collection_file, 'w') as f:
-        json.dump(products_dict, f)
+        }
+        # write to a `.part` file first, so that a failure never leaves a truncated source collection file
+        part_path = source_collection_file.with_suffix('.json.part')
+        try:
+            with open(part_path, 'wb') as f:
+                f.write(b'{"collection":' + _json_dumps(collection_dict) + b',"products":[')
+                for i, record in enumerate(ijson.items(response_file, 'data.item', use_float=True)):
+                    if i:
+                        f.write(b',')
+                    f.write(_json_dumps(record))
+                f.write(b']}')
+            os.replace(part_path, source_collection_file)
+        finally:
+            part_path.unlink(missing_ok=True)
 
     return source_collection_file
 
-def read_collection_metadata(source_collection_file):
-    with open(source_collection_file, 'r') as f:
-        json_dict = json.load(f)
+def _cache_key(source_collection_file):
+    """Returns (resolved path, modification time, size) of a source collection file, used as parsing cache key."""
+    path = Path(source_collection_file).resolve()
+    stat = os.stat(path)
+    return str(path), stat.st_mtime_ns, stat.st_size
 
-    if 'collection' in json_dict.keys():
-        collection_dict = json_dict['collection']
-    else:
+def _create_collection_metadata(collection_dict):
+    if collection_dict is None:
         raise Exception('Not a valid input PSUP source collection JSON file.')
 
     try:
@@ -87,32 +138,127 @@ def read_collection_metadata(source_collection_file):
 
     return collection_metadata
 
+def _parse_source_collection(path):
+    """Parses a source collection file, and returns its collection and products metadata objects."""
+    with open(path, 'rb') as f:
+        json_dict = _json_loads(f.read())
 
-def read_products_metadata(source_collection_file):
     # retrieve metadata schema name
-    collection_metadata = read_collection_metadata(source_collection_file)
+    collection_metadata = _create_collection_metadata(json_dict.get('collection'))
+    if collection_metadata is None:
+        return None, None
     schema_name = collection_metadata.schema_name
 
-    # read source collection file
-    with open(source_collection_file, 'r') as f:
-        json_dict = json.load(f)
-
-    if 'products' in json_dict.keys():
+    if 'products' in json_dict:
         products_dicts = json_dict['products']
     else:
         raise Exception('Not a valid input PSUP source collection JSON file.')
 
-    products = []
-    for product_dict in products_dicts:
+    # create all products metadata objects at once
+    try:
+        product_class = factory.get_metadata_class(schema_name, 'item')
+        products = parse_obj_as(list[product_class], products_dicts)
+    except Exception:
+        # create products metadata objects one by one, so as to report the invalid product
+        products = []
+        for product_dict in products_dicts:
+            try:
+                product_metadata = factory.create_metadata_object(product_dict, schema_name, 'item')
+                products.append(product_metadata)
+            except Exception as e:
+                print(e)
+                print(product_dict)
+                return collection_metadata, None
+
+    return collection_metadata, products
+
+def _schemas_fingerprint(schema_name):
+    """Returns a fingerprint of collection and products metadata schemas, used to invalidate cached metadata objects."""
+    product_class = factory.get_metadata_class(schema_name, 'item')
+    schemas_json = PSUP_Collection.schema_json() + product_class.schema_json()
+    return hashlib.sha256(schemas_json.encode()).hexdigest()
+
+@lru_cache(maxsize=1)
+def _load_source_collection(path, mtime_ns, size):
+    """Returns collection and products metadata objects of a source collection file, parsed once.
+
+    Parsed metadata objects are also persisted in a `.products.pkl` sidecar file, re-used as long as the
+    source collection file modification time and size, and the metadata schemas, are those it was written
+    from. The sidecar file is written by both `read_collection_metadata` and `read_products_metadata`.
+    """
+    cache_path = Path(path).with_suffix('.products.pkl')
+    if cache_path.exists():
+        try:
+            with open(cache_path, 'rb') as f:
+                source_stat, fingerprint, collection_metadata, products = pickle.load(f)
+            # unpickled metadata objects are not validated, so only re-use them if schemas are unchanged
+            if source_stat != (mtime_ns, size):
+                print(f'Source collection file changed, ignoring cached source collection metadata: {cache_path}')
+            elif fingerprint != _schemas_fingerprint(collection_metadata.schema_name):
+                print(f'Metadata schemas changed, ignoring cached source collection metadata: {cache_path}')
+            else:
+                return collection_metadata, products
+        except Exception as e:
+            print(e)
+            print(f'Unable to read cached source collection metadata: {cache_path}')
+
+    collection_metadata, products = _parse_source_collection(path)
+
+    if products is not None:
         try:
-            product_metadata = factory.create_metadata_object(product_dict, schema_name, 'item')
-            products.append(product_metadata)
+            fingerprint = _schemas_fingerprint(collection_metadata.schema_name)
+            part_path = cache_path.with_suffix(cache_path.suffix + '.part')
+            with open(part_path, 'wb') as f:
+                pickle.dump(((mtime_ns, size), fingerprint, collection_metadata, products), f, protocol=5)
+            os.replace(part_path, cache_path)
         except Exception as e:
             print(e)
-            print(product_dict)
-            return
+            print(f'Unable to write cached source collection metadata: {cache_path}')
+
+    return collection_metadata, products
+
+def read_collection_metadata(source_collection_file):
+    """Returns the collection metadata object of a source collection file.
+
+    Products records are parsed as well, and cached in a `.products.pkl` sidecar file written next to the
+    source collection file, so that a following `read_products_metadata` call does not parse it again.
+    """
+    collection_metadata, _ = _load_source_collection(*_cache_key(source_collection_file))
+    return collection_metadata
 
-    return products
+
+def read_products_metadata(source_collection_file):
+    """Returns the list of products metadata objects of a source collection file.
+
+    Parsed metadata objects are cached in a `.products.pkl` sidecar file written next to the source
+    collection file.
+    """
+    _, products = _load_source_collection(*_cache_key(source_collection_file))
+    # return a copy, so that callers can not alter cached products list
+    return list(products) if products is not None else None
+
+
+def _download_one(url, product_path, human_file_size=''):
+    """Downloads a data file to the given product path, and returns its size in bytes.
+
+    Data is first written to a `.part` file, which is renamed to the product path once complete.
+    """
+    print(f'Downloading from {url} ({human_file_size:<10}) to {product_path} ...')
+    part_path = product_path.with_suffix(product_path.suffix + '.part')
+    try:
+        with session.get(url, allow_redirects=True, stream=True) as r:
+            if r.status_code != 200:
+                raise ConnectionError(f'could not download {url}\nerror code: {r.status_code}')
+            r.raw.decode_content = True
+            with open(part_path, 'wb', buffering=1 << 20) as f:
+                shutil.copyfileobj(r.raw, f, length=1 << 20)
+                f.flush()
+                # os.fdatasync is not available on macOS and Windows
+                getattr(os, 'fdatasync', os.fsync)(f.fileno())
+        os.replace(part_path, product_path)
+    finally:
+        part_path.unlink(missing_ok=True)
+    return os.stat(product_path).st_size
 
 
 def download_data_files(source_collection_file, overwrite=False, n_max_items=None):
@@ -135,56 +281,66 @@ def download_data_files(source_collection_file, overwrite=False, n_max_items=Non
         print(f'No products found in {source_collection_file!r}.')
         return
 
-    for product_metadata in products:
-        # schema_name = factory.get_schema_name(product_metadata)
-        # transformer = transformer.create_transformer(schema_name)
-        # # transformer = transformer.create_transformer(product_metadata)
-        # url = transformer.get_download_link(product_metadata)
-        url = product_metadata.get_download_url()
-
-        product_fname = url.split('/')[-1]
+    # set ouput data directory
+    data_dir = Path(source_collection_file).parent / 'data'
 
-        # set ouput data directory
-        data_dir = Path(source_collection_file).parent / 'data'
+    # create data directory if does not exist
+    data_dir.mkdir(parents=True, exist_ok=True)
 
-        # create data directory if does not exist
-        if not data_dir.exists():
-            # shutil.rmtree(data_dir)\
-            data_dir.mkdir()
+    import netCDF4
 
-        product_path = data_dir / product_fname
-        if not product_path.exists() or overwrite:
-            if not products_list:
-                products_to_download = [product_fname]
-            else:
-                products_to_download = products_list
-            if product_fname in products_to_download:
-                print(f'Downloading from {url} ({product_metadata.nc_human_file_size:<10}) to {product_path} ...')
+    downloads = {}
+    submitted_paths = set()
+    with ThreadPoolExecutor(max_workers=MAX_DOWNLOAD_WORKERS) as executor:
+        try:
+            for product_metadata in products:
+                # schema_name = factory.get_schema_name(product_metadata)
+                # transformer = transformer.create_transformer(schema_name)
+                # # transformer = transformer.create_transformer(product_metadata)
+                # url = transformer.get_download_link(product_metadata)
+                url = product_metadata.get_download_url()
+
+                product_fname = url.split('/')[-1]
+
+                product_path = data_dir / product_fname
+                if product_path in submitted_paths:
+                    # same data file already being downloaded, for another product
+                    continue
+                if not product_path.exists() or overwrite:
+                    if not products_list:
+                        products_to_download = [product_fname]
+                    else:
+                        products_to_download = products_list
+                    if product_fname in products_to_download:
+                        future = executor.submit(_download_one, url, product_path, product_metadata.nc_human_file_size)
+                        downloads[future] = product_path
+                        submitted_paths.add(product_path)
+                else:
+                    # check that NetCDF file is readable
+                    try:
+                        r = netCDF4.Dataset(product_path, 'r')
+                        r.close()
+                    except Exception:
+                        print(f'WARNING: {product_path} not a readable NetCDF file.')
+                        # os.remove(product_path)
+                        # if not product_path.exists():
+                        #     print(f'Removed {product_path} file.')
+                        # print('EXISTS')
+                        # print()
+
+            for future in as_completed(downloads):
+                product_path = downloads[future]
                 try:
-                    # urlretrieve(url, product_path)
-                    r = requests.get(url, allow_redirects=True)
-                    if r.status_code != 200:
-                        raise ConnectionError(f'could not download {url}\nerror code: {r.status_code}')
-                    product_path.write_bytes(r.content)
-
-                    size_str = f"{os.stat(product_path).st_size / (1014*1024):.1f}"
-                    print(f'DONE ({size_str} MB)')
+                    size_str = f"{future.result() / (1014*1024):.1f}"
+                    print(f'DONE {product_path} ({size_str} MB)')
                     print()
                 except Exception as e:
-                    print('ERROR')
+                    print(f'ERROR {product_path}')
                     print(e)
                     # os.remove(product_path)
                     # print(f'Removed {product_path} file.')
                     print()
-        else:
-            # check that NetCDF file is readable
-            try:
-                r = netCDF4.Dataset(product_path, 'r')
-                r.close()
-            except:
-                print(f'WARNING: {product_path} not a readable NetCDF file.')
-                # os.remove(product_path)
-                # if not product_path.exists():
-                #     print(f'Removed {product_path} file.')
-                # print('EXISTS')
-                # print()
+        except BaseException:
+            # eg: KeyboardInterrupt, do not wait for queued downloads to complete
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
@@ -26,15 +26,55 @@ from labtools.transformers.transformer import AbstractTransformer, InvalidModelO
 from labtools.transformers import factory as transformer_factory
 from labtools.schemas import factory as metadata_factory
 from labtools.utils import utc_to_iso
-from labtools.ias.netcdf import get_netcdf_footprint, get_netcdf_properties
+from labtools.ias.netcdf import get_netcdf_footprint_and_properties
 
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, timezone
+from functools import lru_cache
+
+@lru_cache(maxsize=128)
+def _get_netcdf_path(download_nc: str, data_path: str) -> Path:
+    return Path(data_path) / 'data' / Path(download_nc).name
+
+@lru_cache(maxsize=128)
+def _get_netcdf_stem(download_nc: str) -> str:
+    return Path(download_nc).stem
 
 class OMEGA_CUBE_STAC_Transformer(AbstractTransformer):
 
+    def __init__(self) -> None:
+        super().__init__()
+        # single timestamp used as default items datetime, so that it does not vary from one item to another
+        self._run_ts = datetime.now(timezone.utc)
+        # footprint geometry and properties of the last read NetCDF file, shared by get_geometry and get_properties
+        self._netcdf_cache: Dict[Path, tuple[Optional[Dict[str, Any]], Dict[str, Any]]] = {}
+        # metadata object types, by metadata class
+        self._object_types: Dict[type, Optional[str]] = {}
+
+    def _resolve_object_type(self, metadata: BaseModel) -> Optional[str]:
+        """Returns the object type of a metadata object, looked up in the schemas registry once per metadata class.
+        """
+        metadata_class = metadata.__class__
+        if metadata_class not in self._object_types:
+            self._object_types[metadata_class] = metadata_factory.get_object_type(metadata)
+        return self._object_types[metadata_class]
+
+    def _load_netcdf(self, netcdf_file: Path) -> tuple[Optional[Dict[str, Any]], Dict[str, Any]]:
+        """Reads and returns footprint geometry and properties from source NetCDF file, opening it once per item.
+        """
+        if netcdf_file not in self._netcdf_cache:
+            # only keep the current file, as geometry and properties are successively derived for each item
+            self._netcdf_cache.clear()
+            self._netcdf_cache[netcdf_file] = get_netcdf_footprint_and_properties(netcdf_file, SCHEMA_NAME)
+        return self._netcdf_cache[netcdf_file]
+
+    def _netcdf_path(self, metadata: OMEGA_Cube_Record, data_path: str) -> Path:
+        """Returns the path of the source NetCDF file of a product, resolved once per item.
+        """
+        return _get_netcdf_path(metadata.download_nc, str(data_path))
+
     def get_item_id(self, metadata: OMEGA_Cube_Record, definition: ItemDefinition = None) -> str:
-        return f'OMEGA_L2_{Path(metadata.download_nc).stem}'  # OMEGA_L2_ORB0018_6
+        return f'OMEGA_L2_{_get_netcdf_stem(metadata.download_nc)}'  # OMEGA_L2_ORB0018_6
         # return f'L3_{int(metadata.orbit_number):04}_{int(metadata.cube_number)}'
 
     def get_collection_id(self, metadata: PSUP_Collection, definition: CollectionDefinition = None) -> str:
@@ -98,13 +138,9 @@ class OMEGA_CUBE_STAC_Transformer(AbstractTransformer):
         """
         geometry = None
         if data_path:
-            netcdf_file = Path(data_path) / 'data' / Path(metadata.download_nc).name
+            netcdf_file = self._netcdf_path(metadata, data_path)
             if netcdf_file.exists():
-                try:
-                    geometry = get_netcdf_footprint(netcdf_file)
-                except Exception as e:
-                    print(e)
-                    print(f'Unable to extract footprint geometry from source NetCDF file: {netcdf_file}')
+                geometry, _ = self._load_netcdf(netcdf_file)
             else:
                 print(f'Source data file not found: {netcdf_file!r}')
         return geometry
@@ -132,7 +168,7 @@ class OMEGA_CUBE_STAC_Transformer(AbstractTransformer):
     def get_properties(self, metadata: OMEGA_Cube_Record, definition: ItemDefinition = None, data_path: str = None) -> PDSSP_STAC_Properties:
 
         properties_dict = {
-            'datetime': datetime.now(),
+            'datetime': self._run_ts,
             'created': None,
             'start_datetime': None,
             'end_datetime': None,
@@ -155,22 +191,18 @@ class OMEGA_CUBE_STAC_Transformer(AbstractTransformer):
 
         # # append data file metadata if available
         if data_path:
-            netcdf_file = Path(data_path) / 'data' / Path(metadata.download_nc).name
+            netcdf_file = self._netcdf_path(metadata, data_path)
             if netcdf_file.exists():
-                try:
-                    netcdf_metadata_dict = get_netcdf_properties(netcdf_file, SCHEMA_NAME)
-                    # print(netcdf_metadata_dict)
-                    properties_dict.update(netcdf_metadata_dict)
-                except Exception as e:
-                    print(e)
-                    print(f'Unable to extract and add properties from NetCDF file: {netcdf_file}')
+                _, netcdf_metadata_dict = self._load_netcdf(netcdf_file)
+                # print(netcdf_metadata_dict)
+                properties_dict.update(netcdf_metadata_dict)
             else:
                 print(f'Source data file not found: {netcdf_file!r}')
 
         return PDSSP_STAC_Properties(**properties_dict)
 
     def get_ssys_properties(self, metadata: OMEGA_Cube_Record, definition: ItemDefinition = None) -> PDSSP_STAC_SsysProperties:
-        object_type = metadata_factory.get_object_type(metadata)
+        object_type = self._resolve_object_type(metadata)
         if object_type == 'item':
             ssys_properties_dict = {
                 'ssys:targets': ['Mars']
@@ -181,7 +213,7 @@ class OMEGA_CUBE_STAC_Transformer(AbstractTransformer):
         return PDSSP_STAC_SsysProperties(**ssys_properties_dict)
 
     def get_ssys_fields(self, metadata: OMEGA_Cube_Record, definition: Union[ItemDefinition, CollectionDefinition] = None) -> dict:
-        object_type = metadata_factory.get_object_type(metadata)
+        object_type = self._resolve_object_type(metadata)
         if object_type == 'item':
             ssys_fields = {}
         elif object_type == 'collection':
@@ -191,7 +223,7 @@ class OMEGA_CUBE_STAC_Transformer(AbstractTransformer):
         return ssys_fields
 
     def get_sci_properties(self, metadata: OMEGA_Cube_Record, definition: ItemDefinition = None) -> Optional[PDSSP_STAC_SciProperties]:
-        object_type = metadata_factory.get_object_type(metadata)
+        object_type = self._resolve_object_type(metadata)
         if object_type == 'item':
             return None
         else:
@@ -199,7 +231,7 @@ class OMEGA_CUBE_STAC_Transformer(AbstractTransformer):
         # return PDSSP_STAC_SciProperties(**sci_properties_dict)
 
     def get_sci_fields(self, metadata: OMEGA_Cube_Record, definition: Union[ItemDefinition, CollectionDefinition] = None) -> dict:
-        object_type = metadata_factory.get_object_type(metadata)
+        object_type = self._resolve_object_type(metadata)
         if object_type == 'collection':
             # set sci_publications as dict (so as to make it "serializable")
             sci_publications = []
@@ -218,7 +250,7 @@ class OMEGA_CUBE_STAC_Transformer(AbstractTransformer):
         return sci_fields
 
     def get_processing_properties(self, metadata: OMEGA_Cube_Record, definition: ItemDefinition = None) -> Optional[PDSSP_STAC_ProcessingProperties]:
-        object_type = metadata_factory.get_object_type(metadata)
+        object_type = self._resolve_object_type(metadata)
         if object_type == 'item':
             return None
         else:
@@ -226,7 +258,7 @@ class OMEGA_CUBE_STAC_Transformer(AbstractTransformer):
         # return PDSSP_STAC_ProcessingProperties(**processing_properties_dict)
 
     def get_processing_fields(self, metadata: OMEGA_Cube_Record, definition: ItemDefinition = None) -> dict:
-        object_type = metadata_factory.get_object_type(metadata)
+        object_type = self._resolve_object_type(metadata)
         if object_type == 'collection':
             processing_fields = {
                 'processing:level': definition.processing_level
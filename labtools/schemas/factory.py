@@ -43,13 +43,17 @@ def get_object_type(metadata: BaseModel):
                     return object_type
     return None
 
+def get_metadata_class(schema_name: str, object_type: str) -> Callable[..., BaseModel]:
+    """Return the metadata class (creator function) of a specific schema, object type."""
+    try:
+        return metadata_creation_funcs[schema_name][object_type]
+    except KeyError:
+        raise ValueError(f'No schema defined for {schema_name!r} schema {object_type!r} object type.') from None
+
 def create_metadata_object(metadata_dict: dict[str, Any], schema_name: str, object_type: str) -> BaseModel:
     """Create a metadata object of a specific schema, object type, given metadata JSON data."""
     # metadata_dict_copy = metadata_dict.copy()
     # character_type = metadata_dict_copy.pop("type")
-    try:
-        creator_func = metadata_creation_funcs[schema_name][object_type]
-    except KeyError:
-        raise ValueError(f'No schema defined for {schema_name!r} schema {object_type!r} object type.') from None
+    creator_func = get_metadata_class(schema_name, object_type)
     # print(metadata_dict)
     return creator_func(**metadata_dict)
\ No newline at end of file
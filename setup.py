@@ -11,6 +11,8 @@ setup(
         'pystac',
         'stac-pydantic',
         'astropy',
+        'ijson>=3.1',
+        'orjson',
         'pyMarsSeason @ git+https://github.com/pole-surfaces-planetaires/pymarsseason.git'
     ],
     entry_points='''